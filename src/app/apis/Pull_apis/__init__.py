@@ -1,10 +1,19 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import requests
+import aiohttp
+import asyncio
+import contextlib
+import json
+import logging
+import random
 import re
+import time
 import databutton as db
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
+from urllib.parse import quote
 
 # Models
 class FileInfo(BaseModel):
@@ -63,155 +72,389 @@ class RepoHistoryResponse(BaseModel):
 class DeleteRepoRequest(BaseModel):
     html_url: str
 
+logger = logging.getLogger(__name__)
+
+# Patterns
+_REPO_URL_RE = re.compile(r'github\.com/([\w-]+)/([\w-]+)')
+_STORAGE_KEY_SANITIZE_RE = re.compile(r'[^a-zA-Z0-9._-]')
+
 # Router
 router = APIRouter(prefix="/pull/api", tags=["pull"])
 
 @router.post("/get-branches")
-def get_branches(request: BranchRequest) -> BranchResponse:
+async def get_branches(request: BranchRequest) -> BranchResponse:
     try:
         owner, repo = extract_repo_path(request.url)
-        headers = {"User-Agent": "Databutton-GitHub-Puller"}
-        
-        # Add token to headers if available
-        try:
-            github_token = db.secrets.get("GITHUB_TOKEN")
-            if github_token:
-                headers["Authorization"] = f"token {github_token}"
-        except Exception:
-            # No token available, continue without it
-            pass
-
-        response = requests.get(
-            f"https://api.github.com/repos/{owner}/{repo}/branches",
-            headers=headers
-        )
+        headers = await asyncio.to_thread(github_headers)
 
-        if response.status_code == 404:
-            raise HTTPException(status_code=404, detail="Repository not found")
-        elif response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail="GitHub API error")
-
-        branches_data = response.json()
-        branch_names = [branch["name"] for branch in branches_data]
+        branch_names = await _list_branches_cached(owner, repo, headers)
         return BranchResponse(branches=branch_names)
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in get_branches: {str(e)}")
+        logger.error("Error in get_branches: %s", e)
         raise HTTPException(status_code=500, detail=str(e)) from None
 
 @router.post("/delete-repo")
 def delete_repo(request: DeleteRepoRequest) -> dict:
     """Delete a repository from history."""
     try:
-        # Get current history
-        history = db.storage.json.get("pull_repo_history", default=[])
+        # Get current history index
+        index = load_history_index()
         
         # Remove the repo with matching html_url
-        history = [repo for repo in history if repo["html_url"] != request.html_url]
+        removed = [entry for entry in index if entry["html_url"] == request.html_url]
+        index = [entry for entry in index if entry["html_url"] != request.html_url]
         
-        # Save updated history
-        db.storage.json.put("pull_repo_history", history)
+        # Save updated index, then drop the stored entries
+        db.storage.json.put(HISTORY_INDEX_KEY, index)
+        delete_history_entries(removed, index)
         
         return {"success": True}
     except Exception as e:
-        print(f"Error in delete_repo: {str(e)}")
+        logger.error("Error in delete_repo: %s", e)
         raise HTTPException(status_code=500, detail=str(e)) from None
 
 # Helper functions
-def fetch_directory_contents(owner: str, repo: str, path: str = "", headers: Optional[Dict] = None, parent_path: Optional[str] = None, depth: int = 0, max_depth: int = 5, file_count: Optional[Dict] = None, branch: Optional[str] = None) -> List[FileInfo]:
-    """Fetch contents of a directory from GitHub recursively.
-    Returns a flat list of all files and directories.
+TOKEN_CACHE_TTL = 300.0  # seconds
+_TOKEN_CACHE: Dict[str, Any] = {"value": None, "headers": MappingProxyType({}), "expires": 0.0}
+
+def _get_token() -> Optional[str]:
+    """Return the GitHub token from secrets, cached for TOKEN_CACHE_TTL seconds."""
+    now = time.time()
+    if now < _TOKEN_CACHE["expires"]:
+        return _TOKEN_CACHE["value"]
+    try:
+        value = db.secrets.get("GITHUB_TOKEN")
+    except Exception:
+        # No token available, continue without it
+        value = None
+    headers = {"Authorization": f"token {value}"} if value else {}
+    _TOKEN_CACHE.update(value=value, headers=MappingProxyType(headers), expires=now + TOKEN_CACHE_TTL)
+    return value
+
+def github_headers() -> Mapping[str, str]:
+    """Return the read-only per-request headers for GitHub calls.
+    Only carries the token; the User-Agent is set on the shared session."""
+    _get_token()
+    return _TOKEN_CACHE["headers"]
+
+HISTORY_INDEX_KEY = "pull_repo_history_index"
+HISTORY_MAX_REPOS = 10
+
+def history_entry_key(slug: str) -> str:
+    """Storage key holding the full RepoResponse for one history entry."""
+    return f"pull_repo_history_entry_{slug}"
+
+def history_slug(html_url: str) -> str:
+    """Create a storage-safe slug for a repository URL."""
+    return _STORAGE_KEY_SANITIZE_RE.sub('_', html_url.replace("https://github.com/", ""))
+
+def delete_history_entries(removed: List[Dict], index: List[Dict]) -> None:
+    """Delete the stored entries of removed index rows, unless the index still uses their slug."""
+    in_use = {entry["slug"] for entry in index}
+    for entry in removed:
+        if entry["slug"] in in_use:
+            continue
+        try:
+            db.storage.json.delete(history_entry_key(entry["slug"]))
+        except Exception as e:
+            logger.warning("Failed to delete history entry %s: %s", entry["slug"], e)
+
+def load_history_index() -> List[Dict]:
+    """Load the ordered history index, newest first.
+    Migrates the old single-blob history the first time it's called."""
+    index = db.storage.json.get(HISTORY_INDEX_KEY, default=None)
+    if isinstance(index, list):
+        return index
+    
+    index = []
+    legacy_history = db.storage.json.get("pull_repo_history", default=[])
+    for entry in legacy_history if isinstance(legacy_history, list) else []:
+        slug = history_slug(entry["html_url"])
+        db.storage.json.put(history_entry_key(slug), entry)
+        index.append({"html_url": entry["html_url"], "slug": slug, "timestamp": entry.get("timestamp")})
+    db.storage.json.put(HISTORY_INDEX_KEY, index)
+    return index
+
+def update_history(response: RepoResponse) -> None:
+    """Store a fetched repo under its own key and move it to the top of the history index."""
+    # Load (and possibly migrate) the index first so the migration can't overwrite the new entry
+    index = load_history_index()
+    
+    slug = history_slug(response.html_url)
+    db.storage.json.put(history_entry_key(slug), response.model_dump(mode="json"))
+    
+    # Remove duplicates based on html_url
+    index = [entry for entry in index if entry["html_url"] != response.html_url]
+    # Add new repo to start of list
+    index.insert(0, {"html_url": response.html_url, "slug": slug, "timestamp": response.timestamp})
+    # Keep only last 10 repos
+    evicted = index[HISTORY_MAX_REPOS:]
+    index = index[:HISTORY_MAX_REPOS]
+    db.storage.json.put(HISTORY_INDEX_KEY, index)
+    delete_history_entries(evicted, index)
+
+# Per-request limit, well below aiohttp's 300 s default so a stalled GitHub call fails the endpoint quickly
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=60, connect=10)
+_SESSION: Optional[aiohttp.ClientSession] = None
+
+def get_session() -> aiohttp.ClientSession:
+    """Return the shared HTTP session, creating it on first use.
+    Reusing one session keeps connections to GitHub alive across requests."""
+    global _SESSION
+    if _SESSION is None or _SESSION.closed:
+        _SESSION = aiohttp.ClientSession(
+            headers={"User-Agent": "Databutton-GitHub-Puller"},
+            connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300),
+            timeout=HTTP_TIMEOUT
+        )
+    return _SESSION
+
+@router.on_event("shutdown")
+async def close_session() -> None:
+    """Close the shared HTTP session when the app shuts down."""
+    global _SESSION
+    if _SESSION is not None and not _SESSION.closed:
+        await _SESSION.close()
+    _SESSION = None
+
+RETRY_BASE_DELAY = 1.0  # seconds
+RETRY_MAX_DELAY = 60.0  # seconds, for server errors
+RETRY_MAX_TOTAL = 3600.0  # seconds spent waiting across all retries
+DOWNLOAD_CONCURRENCY = 16  # parallel raw file downloads in pull_files
+STORAGE_CONCURRENCY = 8  # parallel storage writes in pull_files
+
+def get_retry_delay(response: aiohttp.ClientResponse, attempt: int) -> Optional[float]:
+    """Return how long to wait before retrying a failed GitHub request,
+    or None if the response should not be retried."""
+    jitter = random.uniform(0, RETRY_BASE_DELAY)
+    status = response.status
+    
+    # Primary rate limit: wait until the quota resets
+    reset = response.headers.get("X-RateLimit-Reset")
+    if status == 403 and response.headers.get("X-RateLimit-Remaining") == "0" and reset:
+        return max(0.0, int(reset) - time.time()) + jitter
+    
+    # Secondary rate limit: honour Retry-After when given
+    retry_after = response.headers.get("Retry-After")
+    if status == 429 or (status == 403 and retry_after):
+        if retry_after and retry_after.isdigit():
+            return int(retry_after) + jitter
+        return RETRY_BASE_DELAY * 2 ** attempt + jitter
+    
+    if status >= 500:
+        return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) + jitter
+    
+    return None
+
+# GitHub's secondary rate limit kicks in above roughly 10 concurrent API requests
+_GH_API_SEM = asyncio.Semaphore(10)
+
+ETAG_CACHE_MAX_BYTES = 8 * 1024 * 1024  # raw response bytes kept across all URLs
+ETAG_CACHE_MAX_ENTRY_BYTES = 1024 * 1024  # larger responses are not kept at all
+_ETAG_CACHE: Dict[str, Tuple[str, bytes]] = {}
+
+def etag_cache_put(url: str, etag: str, raw: bytes) -> None:
+    """Remember a response body for revalidation, evicting the oldest entries
+    until the cache fits in ETAG_CACHE_MAX_BYTES."""
+    _ETAG_CACHE.pop(url, None)
+    if len(raw) > ETAG_CACHE_MAX_ENTRY_BYTES:
+        return
+    total = sum(len(body) for _, body in _ETAG_CACHE.values()) + len(raw)
+    while _ETAG_CACHE and total > ETAG_CACHE_MAX_BYTES:
+        oldest = next(iter(_ETAG_CACHE))
+        total -= len(_ETAG_CACHE.pop(oldest)[1])
+    _ETAG_CACHE[url] = (etag, raw)
+
+async def github_get(url: str, headers: Optional[Mapping[str, str]] = None, max_retries: int = 6, as_json: bool = True) -> Tuple[int, Any]:
+    """GET a GitHub URL, retrying rate-limited and server errors with exponential backoff.
+    Returns the final status code and the body (parsed JSON, or raw bytes if as_json is False).
+    The body is None unless the status is 200.
+    
+    JSON responses are revalidated with If-None-Match; a 304 (which costs no rate limit)
+    returns the previously seen body with status 200. Bodies are kept as raw bytes,
+    bounded by size, and parsed again on reuse."""
+    cached = _ETAG_CACHE.get(url) if as_json else None
+    if cached is not None:
+        headers = {**(headers or {}), "If-None-Match": cached[0]}
+    
+    session = get_session()
+    # Only api.github.com counts towards the concurrency limit; raw downloads are capped separately
+    limiter = _GH_API_SEM if url.startswith("https://api.github.com/") else contextlib.nullcontext()
+    waited = 0.0
+    for attempt in range(max_retries + 1):
+        async with limiter, session.get(url, headers=headers) as response:
+            status = response.status
+            if status == 304 and cached is not None:
+                return 200, json.loads(cached[1])
+            if status == 200:
+                raw = await response.read()
+                if not as_json:
+                    return status, raw
+                etag = response.headers.get("ETag")
+                if etag:
+                    etag_cache_put(url, etag, raw)
+                return status, json.loads(raw)
+            delay = get_retry_delay(response, attempt)
+        
+        if delay is None or attempt == max_retries or waited + delay > RETRY_MAX_TOTAL:
+            break
+        logger.warning("GitHub returned %s for %s, retrying in %.1fs", status, url, delay)
+        await asyncio.sleep(delay)
+        waited += delay
+    
+    return status, None
+
+def build_file_tree(owner: str, repo: str, branch: str, tree_items: List[Dict], max_files: int = 100, max_depth: int = 5) -> List[FileInfo]:
+    """Build the nested file listing from a recursive git tree response.
+    Returns the top-level entries, with sub-entries attached as children.
     
     Args:
         owner: Repository owner
         repo: Repository name
-        path: Path within repository to fetch
-        headers: Request headers
-        parent_path: Parent directory path
-        depth: Current recursion depth
-        max_depth: Maximum recursion depth
-        file_count: Dictionary to track file count (pass {"count": 0} to start tracking)
+        branch: Branch (or other ref) used for the raw download URLs
+        tree_items: The "tree" array of a git/trees?recursive=1 response
+        max_files: Maximum number of entries to include
+        max_depth: Maximum directory depth to include
     """
-    # Initialize file count if not provided
-    if file_count is None:
-        file_count = {"count": 0}
-    
-    # Check if we've hit the file limit
-    if file_count["count"] >= 100:  # Limit to 100 files total
-        print(f"Reached file limit of 100, stopping recursion")
-        return []
-    
-    if headers is None:
-        headers = {"User-Agent": "Databutton-GitHub-Puller"}
-    
-    url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}"    
-    if branch:
-        url += f"?ref={branch}"
-    url = url.rstrip('/')
-    print(f"[{file_count['count']} files] Fetching {url}")
-    response = requests.get(url, headers=headers)
-    
-    # Check rate limiting
-    remaining = response.headers.get('X-RateLimit-Remaining')
-    if remaining:
-        print(f"GitHub API calls remaining: {remaining}")
-    
-    if response.status_code != 200:
-        print(f"Failed to fetch contents for {path}: {response.status_code}")
-        return []
-    
-    contents_data = response.json()
-    if not isinstance(contents_data, list):
-        contents_data = [contents_data]
+    type_names = {"blob": "file", "tree": "dir", "commit": "submodule"}
     
-    contents = []
-    for item in contents_data:
-        # Update file count
-        file_count["count"] += 1
-        print(f"Found {item['type']}: {item['path']} (parent: {parent_path})")
-        file_info = FileInfo(
-            name=item["name"],
-            path=item["path"],
-            type=item["type"],
-            download_url=item.get("download_url"),
-            parent_path=parent_path,
-            children=[]
-        )
+    all_items: List[FileInfo] = []
+    for item in tree_items:
+        if len(all_items) >= max_files:
+            logger.info("Reached file limit of %d, stopping", max_files)
+            break
+        
+        path = item["path"]
+        if path.count("/") > max_depth:
+            continue
         
-        # Recursively fetch contents if it's a directory and we haven't reached max depth
-        if item["type"] == "dir" and depth < max_depth and file_count["count"] < 100:
-            sub_contents = fetch_directory_contents(owner, repo, item["path"], headers, item["path"], depth + 1, max_depth, file_count, branch)
-            file_info.children = sub_contents
+        parent_path, _, name = path.rpartition("/")
+        item_type = type_names.get(item["type"], item["type"])
+        download_url = None
+        if item_type == "file":
+            download_url = f"https://raw.githubusercontent.com/{owner}/{repo}/{branch}/{quote(path)}"
         
-        contents.append(file_info)
+        logger.debug("Found %s: %s (parent: %s)", item_type, path, parent_path or None)
+        all_items.append(FileInfo.model_construct(
+            name=name,
+            path=path,
+            type=item_type,
+            download_url=download_url,
+            parent_path=parent_path or None,
+            children=[]
+        ))
+    
+    # Attach every entry to its parent directory
+    by_path = {file_info.path: file_info for file_info in all_items}
+    contents = []
+    for file_info in all_items:
+        parent = by_path.get(file_info.parent_path) if file_info.parent_path else None
+        if parent is not None:
+            parent.children.append(file_info)
+        elif file_info.parent_path is None:
+            contents.append(file_info)
     
     return contents
 
+CACHE_TTL = 120.0  # seconds
+CACHE_MAXSIZE = 128
+_RESPONSE_CACHE: Dict[Tuple, Tuple[Any, float]] = {}
+
+def cache_get(key: Tuple) -> Optional[Any]:
+    """Return the cached value for key, or None if missing or expired."""
+    entry = _RESPONSE_CACHE.get(key)
+    if entry is None:
+        return None
+    value, expires = entry
+    if time.time() >= expires:
+        del _RESPONSE_CACHE[key]
+        return None
+    return value
+
+def cache_put(key: Tuple, value: Any) -> None:
+    """Cache value for CACHE_TTL seconds, evicting the oldest entry when full."""
+    _RESPONSE_CACHE.pop(key, None)
+    if len(_RESPONSE_CACHE) >= CACHE_MAXSIZE:
+        del _RESPONSE_CACHE[next(iter(_RESPONSE_CACHE))]
+    _RESPONSE_CACHE[key] = (value, time.time() + CACHE_TTL)
+
+async def _list_branches_cached(owner: str, repo: str, headers: Mapping[str, str]) -> List[str]:
+    """List the branch names of a repository, reusing recent results."""
+    key = ("branches", owner, repo)
+    branch_names = cache_get(key)
+    if branch_names is not None:
+        return branch_names
+    
+    status, branches_data = await github_get(f"https://api.github.com/repos/{owner}/{repo}/branches", headers)
+    if status == 404:
+        raise HTTPException(status_code=404, detail="Repository not found")
+    elif status != 200:
+        raise HTTPException(status_code=status, detail="GitHub API error")
+    
+    branch_names = [branch["name"] for branch in branches_data]
+    cache_put(key, branch_names)
+    return branch_names
+
+async def _fetch_repo_cached(owner: str, repo: str, branch: Optional[str], headers: Mapping[str, str]) -> Tuple[Dict, List[FileInfo]]:
+    """Fetch repository metadata and its file tree, reusing recent results.
+    Falls back to the default branch when branch is None."""
+    key = ("repo", owner, repo, branch)
+    cached = cache_get(key)
+    if cached is not None:
+        return cached
+    
+    status, data = await github_get(f"https://api.github.com/repos/{owner}/{repo}", headers)
+    if status == 404:
+        raise HTTPException(status_code=404, detail="Repository not found")
+    elif status != 200:
+        raise HTTPException(status_code=status, detail="GitHub API error")
+    
+    # Fall back to the default branch when none was requested
+    ref = branch or data["default_branch"]
+    
+    # Fetch the whole tree in a single call
+    tree_url = f"https://api.github.com/repos/{owner}/{repo}/git/trees/{quote(ref, safe='')}?recursive=1"
+    logger.debug("Fetching %s", tree_url)
+    status, tree_data = await github_get(tree_url, headers)
+    if status != 200:
+        logger.warning("Failed to fetch tree for %s: %s", ref, status)
+        return data, []
+    
+    tree_items = tree_data.get("tree", [])
+    contents = build_file_tree(owner, repo, ref, tree_items)
+    logger.info("Fetched %d tree entries in total", len(tree_items))
+    
+    cache_put(key, (data, contents))
+    return data, contents
+
 def extract_repo_path(url: str) -> Tuple[str, str]:
-    pattern = r'github\.com/([\w-]+)/([\w-]+)'
-    match = re.search(pattern, url)
+    match = _REPO_URL_RE.search(url)
     if not match:
         raise HTTPException(status_code=400, detail="Invalid GitHub URL format")
     return match.groups()
 
 # Helper function for logging steps
 def log_step(step: str, *args) -> None:
-    print(f"[STEP] {step}:", *args)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[STEP] %s: %s", step, " ".join(str(arg) for arg in args))
 
 @router.get("/history")
 def get_repo_history() -> RepoHistoryResponse:
     """Get the history of fetched repositories."""
     try:
-        # Get history from storage
-        history = db.storage.json.get("pull_repo_history", default=[])
-        if not isinstance(history, list):
-            history = []
+        # Get history index, then load the entries in parallel
+        index = load_history_index()
+        with ThreadPoolExecutor(max_workers=HISTORY_MAX_REPOS) as executor:
+            entries = list(executor.map(
+                lambda entry: db.storage.json.get(history_entry_key(entry["slug"]), default=None),
+                index
+            ))
+        history = [entry for entry in entries if entry]
         return RepoHistoryResponse(repos=history)
     except Exception as e:
-        print(f"Error in get_repo_history: {str(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error in get_repo_history: %s", e)
         # Return empty history on error
         return RepoHistoryResponse(repos=[])
 
@@ -219,55 +462,23 @@ def get_repo_history() -> RepoHistoryResponse:
 def save_token(body: TokenRequest) -> dict:
     try:
         db.secrets.put("GITHUB_TOKEN", body.token)
+        # Force the next request to read the new token
+        _TOKEN_CACHE["expires"] = 0.0
         return {"success": True}
     except Exception as e:
-        print(f"Error in save_token: {str(e)}")
+        logger.error("Error in save_token: %s", e)
         raise HTTPException(status_code=500, detail=str(e)) from None
 
 @router.post("/fetch-repo")
-def fetch_repo(request: RepoRequest) -> RepoResponse:
+async def fetch_repo(request: RepoRequest) -> RepoResponse:
     try:
         owner, repo = extract_repo_path(request.url)
-        log_step("Setting up headers")
-        headers = {"User-Agent": "Databutton-GitHub-Puller"}
+        headers = await asyncio.to_thread(github_headers)
         
-        # Add token to headers if available
-        try:
-            github_token = db.secrets.get("GITHUB_TOKEN")
-            if github_token:
-                headers["Authorization"] = f"token {github_token}"
-        except Exception:
-            # No token available, continue without it
-            pass
-        
-        # Get the branch from the request
-        branch = request.branch
-        
-        response = requests.get(
-            f"https://api.github.com/repos/{owner}/{repo}",
-            headers=headers
-        )
+        data, contents = await _fetch_repo_cached(owner, repo, request.branch, headers)
         
-        if response.status_code == 404:
-            raise HTTPException(status_code=404, detail="Repository not found")
-        elif response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail="GitHub API error")
-        
-        data = response.json()
-        
-        # Fetch all contents recursively with file count tracking
-        file_count = {"count": 0}
-        contents = fetch_directory_contents(owner, repo, "", headers, file_count=file_count, branch=branch)
-        
-        # If a specific branch was requested, update the contents URL to use that branch
-        if request.branch:
-            for content in contents:
-                if content.download_url:
-                    content.download_url = content.download_url.replace("/master/", f"/{request.branch}/").replace("/main/", f"/{request.branch}/")
-        print(f"Fetched {file_count['count']} files in total")
-        
-        # Create response
-        response = RepoResponse(
+        # Create response (GitHub data is trusted, skip validation)
+        response = RepoResponse.model_construct(
             name=data["name"],
             full_name=data["full_name"],
             description=data["description"],
@@ -280,24 +491,17 @@ def fetch_repo(request: RepoRequest) -> RepoResponse:
             timestamp=datetime.now().isoformat()
         )
         
-        # Update history
+        # Update history off the event loop; storage calls are blocking
         try:
-            history = db.storage.json.get("pull_repo_history", default=[])
-            # Remove duplicates based on html_url
-            history = [repo for repo in history if repo["html_url"] != response.html_url]
-            # Add new repo to start of list
-            history.insert(0, response.dict())
-            # Keep only last 10 repos
-            history = history[:10]
-            db.storage.json.put("pull_repo_history", history)
+            await asyncio.to_thread(update_history, response)
         except Exception as e:
-            print(f"Failed to update history: {e}")
+            logger.warning("Failed to update history: %s", e)
         
         return response
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in fetch_repo: {str(e)}")
+        logger.error("Error in fetch_repo: %s", e)
         raise HTTPException(status_code=500, detail=str(e)) from None
 
 def get_storage_key(file_type: str, filename: str) -> str:
@@ -319,137 +523,170 @@ def get_storage_key(file_type: str, filename: str) -> str:
     # Create storage key
     return f"{prefix}_{base_name}"
 
-def determine_file_location(file_path: str, content: bytes) -> Optional[str]:
-    """Determine where to save the file based on its path and content.
+# Directories under src/ that decide the target folder, in priority order
+_DIR_ROUTES: Dict[str, str] = {
+    'pages': 'ui/src/pages',
+    'components': 'ui/src/components',
+    'util': 'ui/src/utils',
+    'utils': 'ui/src/utils',
+    'hooks': 'ui/src/hooks',
+}
+
+# Fallback target folder by file extension
+_EXT_ROUTES: Dict[str, str] = {
+    'py': 'src/app/apis',
+    'tsx': 'ui/src/utils',
+    'jsx': 'ui/src/utils',
+    'ts': 'ui/src/utils',
+    'js': 'ui/src/utils',
+    'css': 'ui/src/styles',
+    'scss': 'ui/src/styles',
+    'sass': 'ui/src/styles',
+}
+
+def determine_file_location(file_path: str) -> Optional[str]:
+    """Determine where to save the file based on its path.
     Preserves original directory structure when appropriate."""
     # Split path into directory and filename
     path_parts = file_path.split('/')
     filename = path_parts[-1]
     
     # Get file extension
-    ext = filename.split('.')[-1].lower() if '.' in filename else ''
+    ext = filename.rpartition('.')[2].lower() if '.' in filename else ''
     
     # Handle source directory structure
-    if 'src' in path_parts:
+    try:
         src_index = path_parts.index('src')
-        sub_path = path_parts[src_index:]
-        
-        # Handle specific directories
-        if 'pages' in sub_path:
-            return f"ui/src/pages/{filename}"
-        elif 'components' in sub_path:
-            return f"ui/src/components/{filename}"
-        elif 'util' in sub_path or 'utils' in sub_path:
-            return f"ui/src/utils/{filename}"
-        elif 'hooks' in sub_path:
-            return f"ui/src/hooks/{filename}"
-        elif 'backends' in sub_path and ext == 'py':
-            return f"src/app/apis/{filename}"
+    except ValueError:
+        src_index = None
+    if src_index is not None:
+        sub_path = set(path_parts[src_index:])
+        for dir_name, target_dir in _DIR_ROUTES.items():
+            if dir_name in sub_path:
+                return f"{target_dir}/{filename}"
     
     # Fallback to extension-based mapping
-    if ext == 'py':
-        return f"src/app/apis/{filename}"
-    elif ext in ['tsx', 'jsx', 'ts', 'js']:
+    target_dir = _EXT_ROUTES.get(ext)
+    if target_dir is None:
+        # Unsupported file
+        return None
+    
+    # Scripts outside a known directory are routed by their name
+    if ext in ('tsx', 'jsx', 'ts', 'js'):
         if filename.startswith(('use', 'Use')):
-            return f"ui/src/hooks/{filename}"
+            target_dir = 'ui/src/hooks'
         elif 'page' in filename.lower() or filename == 'test1.tsx':
-            return f"ui/src/pages/{filename}"
+            target_dir = 'ui/src/pages'
         elif 'component' in filename.lower():
-            return f"ui/src/components/{filename}"
-        else:
-            return f"ui/src/utils/{filename}"
-    elif ext in ['css', 'scss', 'sass']:
-        return f"ui/src/styles/{filename}"
+            target_dir = 'ui/src/components'
     
-    # Return None for unsupported files
-    return None
-
-def read_file_content(url: str, headers: dict) -> Tuple[bytes, str]:
-    """Read file content and detect if it's text or binary."""
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    content = response.content
+    return f"{target_dir}/{filename}"
+
+async def read_file_content(url: str, headers: Mapping[str, str], semaphore: asyncio.Semaphore) -> Tuple[Union[bytes, str], str]:
+    """Read file content and detect if it's text or binary.
+    Text content is returned already decoded."""
+    async with semaphore:
+        status, content = await github_get(url, headers, as_json=False)
+    if status != 200:
+        raise HTTPException(status_code=status, detail=f"Failed to download {url}")
+    
+    # A NUL byte near the start means binary; skip decoding entirely
+    if b'\x00' in content[:8192]:
+        return content, 'binary'
     
     # Try to decode as text
     try:
-        content.decode('utf-8')
-        return content, 'text'
+        return content.decode('utf-8'), 'text'
     except UnicodeDecodeError:
         return content, 'binary'
 
+async def pull_file(file: FileInfo, target_path: str, headers: Mapping[str, str], semaphore: asyncio.Semaphore, executor: ThreadPoolExecutor) -> Optional[Dict]:
+    """Download one file and store it if it's text.
+    Returns its entry for the pulled files list, or None if it was skipped."""
+    try:
+        log_step("Processing file", file.path)
+        content, content_type = await read_file_content(file.download_url, headers, semaphore)
+        logger.debug("Downloaded %s (%s)", file.path, content_type)
+        
+        log_step("Checking content type", content_type)
+        # Only handle text files
+        if content_type != 'text':
+            logger.debug("Skipped binary file: %s", file.path)
+            return None
+        
+        # Create a sanitized storage key
+        storage_key = _STORAGE_KEY_SANITIZE_RE.sub('_', f"pulled_file_{file.path}")
+        logger.debug("Using storage key: %s", storage_key)
+        
+        # Save the file content
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(executor, db.storage.text.put, storage_key, content)
+        logger.debug("Saved file to storage: %s", storage_key)
+        return {
+            "storage_key": storage_key,
+            "target_path": target_path,
+            "size": len(content)
+        }
+    except Exception as e:
+        logger.error("Failed to process %s: %s", file.path, e)
+        raise
+
 @router.post("/pull-files")
-def pull_files(request: PullFilesRequest) -> PullFilesResponse:
-    print("Starting pull_files with request:", request)
-    print("Files to process:", [f"{f.type}: {f.path} ({f.download_url})" for f in request.files])
+async def pull_files(request: PullFilesRequest) -> PullFilesResponse:
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Files to process: %s", [f"{f.type}: {f.path} ({f.download_url})" for f in request.files])
     
     try:
-        headers = {"User-Agent": "Databutton-GitHub-Puller"}
-        
-        # Add token to headers if available
-        try:
-            github_token = db.secrets.get("GITHUB_TOKEN")
-            if github_token:
-                headers["Authorization"] = f"token {github_token}"
-        except Exception:
-            # No token available, continue without it
-            pass
+        headers = await asyncio.to_thread(github_headers)
 
         log_step("Starting file processing")
         processed_files = []
 
+        # Route files up front so unsupported ones are never downloaded
+        files_to_download = []
+        target_paths = []
         for file in request.files:
             if file.type != "file" or not file.download_url:
-                print(f"Skipping {file.path}: type={file.type}, download_url={file.download_url}")
+                logger.debug("Skipping %s: type=%s, download_url=%s", file.path, file.type, file.download_url)
                 continue
-
-            try:
-                log_step(f"Processing file", file.path)
-                # Download and detect file type
-                log_step("Downloading file content")
-                content, content_type = read_file_content(file.download_url, headers)
-                print(f"Downloaded {file.path} ({content_type})")
-                
-                log_step("Checking content type", content_type)
-                # Only handle text files
-                if content_type != 'text':
-                    print(f"Skipped binary file: {file.path}")
-                    continue
-                
-                log_step("Determining target location")
-                target_path = determine_file_location(file.path, content)
-                print(f"Target path for {file.path}: {target_path}")
-                
-                if target_path:
-                    try:
-                        file_content = content.decode('utf-8')
-                        # Create a sanitized storage key
-                        storage_key = re.sub(r'[^a-zA-Z0-9._-]', '_', f"pulled_file_{file.path}")
-                        print(f"Using storage key: {storage_key}")
-                        
-                        # Save the file content
-                        db.storage.text.put(storage_key, file_content)
-                        processed_files.append({
-                            "storage_key": storage_key,
-                            "target_path": target_path,
-                            "content": file_content
-                        })
-                        print(f"Saved file to storage: {storage_key}")
-                    except Exception as e:
-                        print(f"Failed to save file {target_path}: {str(e)}")
-                        raise
-                else:
-                    print(f"No target path determined for {file.path}")
-            except Exception as e:
-                print(f"Failed to process {file.path}: {str(e)}")
-                raise
+            target_path = determine_file_location(file.path)
+            logger.debug("Target path for %s: %s", file.path, target_path)
+            if not target_path:
+                logger.debug("No target path determined for %s", file.path)
+                continue
+            files_to_download.append(file)
+            target_paths.append(target_path)
+
+        # Download and store every file concurrently; storage writes run on a thread pool
+        # so they overlap with the downloads still in flight
+        log_step("Pulling files", len(files_to_download))
+        semaphore = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+        executor = ThreadPoolExecutor(max_workers=STORAGE_CONCURRENCY)
+        try:
+            results = await asyncio.gather(
+                *(pull_file(file, target_path, headers, semaphore, executor)
+                  for file, target_path in zip(files_to_download, target_paths)),
+                return_exceptions=True
+            )
+        finally:
+            # Don't block the event loop on the pool; on cancellation in-flight writes finish in the background
+            executor.shutdown(wait=False)
+
+        # Results keep the order of files_to_download
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+            if result is not None:
+                processed_files.append(result)
+        logger.info("Saved %d files to storage", len(processed_files))
 
         # Save the list of processed files to storage
         if processed_files:
             try:
-                db.storage.json.put("pulled_files_list", processed_files)
-                print(f"Saved list of {len(processed_files)} files to storage")
+                await asyncio.to_thread(db.storage.json.put, "pulled_files_list", processed_files)
+                logger.info("Saved list of %d files to storage", len(processed_files))
             except Exception as e:
-                print(f"Failed to save files list: {str(e)}")
+                logger.error("Failed to save files list: %s", e)
                 raise HTTPException(status_code=500, detail=f"Failed to save files list: {str(e)}") from None
 
         return PullFilesResponse(
@@ -457,5 +694,5 @@ def pull_files(request: PullFilesRequest) -> PullFilesResponse:
             created_files=[f["target_path"] for f in processed_files]
         )
     except Exception as e:
-        print(f"Error in pull_files: {str(e)}")
+        logger.error("Error in pull_files: %s", e)
         raise HTTPException(status_code=500, detail=str(e)) from None